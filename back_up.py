@@ -1,3 +1,10 @@
+"""Legacy single-file version of the Rekap RGU app, kept for reference.
+
+The live app is split into `pages/` and `services/`; nothing imports this
+module. It has no import-time Streamlit side effects, so importing it by
+accident doesn't register a second page config.
+"""
+
 import json
 import threading
 import time
@@ -8,8 +15,6 @@ import pandas as pd
 import requests
 import streamlit as st
 
-st.set_page_config(page_title="Rekap RGU", page_icon="📊", layout="wide")
-
 
 class AuditQueueManager:
     """Queue manager for audit API requests with error handling and rate limiting"""
@@ -925,6 +930,7 @@ def render_main_content(df: pd.DataFrame):
 
 
 def main():
+    st.set_page_config(page_title="Rekap RGU", page_icon="📊", layout="wide")
     st.title("Rekap RGU")
     st.markdown(
         "Aplikasi telah dipisah menjadi halaman. Gunakan menu **Pages** di kiri untuk membuka:\n\n- Report: Matrix & Kalkulasi\n- Audit & Status: API checker\n\nJika Anda ingin menjalankan halaman secara terpisah, buka file di folder `pages/`."
@@ -1,21 +1,48 @@
+import time
+
+import numpy as np
+import pandas as pd
 import streamlit as st
 
+try:
+    import plotly.express as px
+except ImportError:
+    px = None
+
 from services.data_service import (
-    fetch_and_process_data,
-    get_dashboard_metrics,
-    get_status_counts,
-    get_styled_summary_table,
+    REPORT_TTL,
+    build_report_views,
+    clear_report_cache,
+    fetch_and_process_data_async,
+    normalize_kode_produk,
 )
 
 st.set_page_config(page_title="Rekap RGU - Report", page_icon="📊", layout="wide")
 
 # Initialize control state
-if "active_kode" not in st.session_state:
-    st.session_state.active_kode = None
-if "tgl_awal" not in st.session_state:
-    st.session_state.tgl_awal = None
-if "tgl_akhir" not in st.session_state:
-    st.session_state.tgl_akhir = None
+for key, default in {"active_kode": None, "tgl_awal": None, "tgl_akhir": None}.items():
+    st.session_state.setdefault(key, default)
+
+# tgl_status holds the full datetime64 timestamp; show it as a plain date
+DATA_COLUMN_CONFIG = {
+    "tgl_status": st.column_config.DateColumn("tgl_status", format="YYYY-MM-DD"),
+}
+
+NS_PER_DAY = 86_400 * 1_000_000_000
+
+# Bar colors per final_status in the dashboard chart
+STATUS_COLOR_MAP = {
+    "SUKSES PROFIT": "#1f77b4",
+    "SUKSES LOSS": "#2a9df4",
+    "GAGAL A1": "#d62728",
+}
+
+# Upper bound on rows serialized for the Raw Data preview
+RAW_DATA_MAX_ROWS = 10_000
+
+# Audit tolerance result -> (label, color), keyed by "within tolerance"
+AUDIT_STATUS = {True: ("COCOK", "green"), False: ("SELISIH", "red")}
+format_rupiah = "Rp {:,.0f}".format
 
 
 def render_sidebar():
@@ -33,20 +60,162 @@ def render_sidebar():
             width="stretch",
             key="apply_filter_button",
         ):
-            st.session_state.active_kode = kode_input
+            # Canonical list, so "saka, mdm" reuses the cached "mdm,saka" load
+            st.session_state.active_kode = normalize_kode_produk(kode_input)
             st.session_state.tgl_awal = tgl_awal
             st.session_state.tgl_akhir = tgl_akhir
 
+        if st.button("Refresh Data", width="stretch", key="refresh_data_button"):
+            # Drop cached results so the active filter is queried again
+            clear_report_cache()
+            st.session_state.pop("fetch_job", None)
+
         st.info("Gunakan tab 'Interaktif' untuk filter detail tambahan")
 
 
+def kode_produk_mask(kode_produk: pd.Series, needle: str) -> np.ndarray:
+    """Case-insensitive substring match on the categorical kode_produk column.
+
+    Only the distinct categories are searched; rows are then matched by code.
+    """
+    hits = kode_produk.cat.categories.str.contains(needle, case=False, regex=False)
+    return np.isin(kode_produk.cat.codes.to_numpy(), np.flatnonzero(hits))
+
+
+def time_to_ns(t) -> int:
+    """Nanoseconds since midnight for a datetime.time."""
+    seconds = t.hour * 3600 + t.minute * 60 + t.second
+    return seconds * 1_000_000_000 + t.microsecond * 1_000
+
+
+def datetime_window_mask(
+    tgl_status: pd.Series, start_date, end_date, jam_start, jam_end
+) -> np.ndarray:
+    """Rows dated within [start_date, end_date] and timed within [jam_start, jam_end].
+
+    Works on the int64 nanosecond view of tgl_status: the date range is two
+    integer compares and the time of day is the remainder modulo one day,
+    instead of comparing Python time objects in jam_status.
+    """
+    ns = tgl_status.to_numpy(dtype="datetime64[ns]").view("i8")
+    date_lo = pd.Timestamp(start_date).value
+    date_hi = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).value
+    time_of_day = ns % NS_PER_DAY
+    return (
+        (ns >= date_lo)
+        & (ns < date_hi)
+        & (time_of_day >= time_to_ns(jam_start))
+        & (time_of_day <= time_to_ns(jam_end))
+    )
+
+
+def final_status_mask(final_status: pd.Series, statuses) -> np.ndarray:
+    """Rows whose categorical final_status is one of `statuses`.
+
+    There are only three statuses, so OR-ing code equalities is cheaper
+    than building an isin hash table.
+    """
+    codes = final_status.cat.codes.to_numpy()
+    categories = final_status.cat.categories
+    mask = np.zeros(len(codes), dtype=bool)
+    for status in statuses:
+        mask |= codes == categories.get_loc(status)
+    return mask
+
+
+def count_final_status(final_status: pd.Series, mask: np.ndarray) -> pd.Series:
+    """Count every final_status among the masked rows in one bincount pass."""
+    codes = final_status.cat.codes.to_numpy()[mask]
+    categories = final_status.cat.categories
+    return pd.Series(np.bincount(codes, minlength=len(categories)), index=categories)
+
+
+def get_audit_sync_data():
+    """Synced audit chunks as one frame, concatenated once per new sync."""
+    chunks = st.session_state.get("audit_sync_chunks")
+    if not chunks:
+        return None
+    cached = st.session_state.get("audit_sync_cache")
+    if cached is None or cached[0] != len(chunks):
+        cached = (len(chunks), pd.concat(chunks, ignore_index=True))
+        st.session_state.audit_sync_cache = cached
+    return cached[1]
+
+
+@st.cache_data
+def build_status_chart(status_counts: pd.DataFrame):
+    """Final status bar chart, cached on the (three-row) counts table."""
+    fig = px.bar(
+        status_counts,
+        x="final_status",
+        y="count",
+        color="final_status",
+        color_discrete_map=STATUS_COLOR_MAP,
+        title="Distribusi Final Status (count)",
+    )
+    fig.update_traces(texttemplate="%{y}", textposition="outside")
+    fig.update_layout(yaxis_title="Count", xaxis_title="", margin=dict(t=30, b=20))
+    return fig
+
+
+@st.fragment(run_every=1)
+def render_loading(future):
+    """Poll the background load and rerun the page once it has finished"""
+    if future.done():
+        st.rerun()
+    st.info("Memuat data dari database...")
+
+
+def load_data():
+    """Return (data, views) for the active filter; None while loading or on failure.
+
+    The query runs in a background thread so the page (sidebar included)
+    stays interactive during the SQL round-trip. `views` is built from the
+    same frame (see build_report_views), so every tab shows one load. The
+    job is submitted again once it is REPORT_TTL seconds old, like the
+    cached load behind it.
+    """
+    params = (
+        st.session_state.active_kode,
+        st.session_state.tgl_awal,
+        st.session_state.tgl_akhir,
+    )
+    job = st.session_state.get("fetch_job")
+    if (
+        job is None
+        or job["params"] != params
+        or time.monotonic() - job["submitted"] >= REPORT_TTL
+    ):
+        job = {
+            "params": params,
+            "future": fetch_and_process_data_async(*params),
+            "submitted": time.monotonic(),
+            "views": None,
+        }
+        st.session_state.fetch_job = job
+
+    future = job["future"]
+    if not future.done():
+        render_loading(future)
+        return None
+    error = future.exception()
+    if error is not None:
+        # Forget the failed job so the next rerun queries again
+        st.session_state.pop("fetch_job", None)
+        st.error(f"Gagal memuat data dari database: {error}")
+        return None
+    data = future.result()
+    if job["views"] is None:
+        job["views"] = build_report_views(data)
+    return data, job["views"]
+
+
 def render_main():
     if st.session_state.active_kode:
-        data = fetch_and_process_data(
-            st.session_state.active_kode,
-            st.session_state.tgl_awal,
-            st.session_state.tgl_akhir,
-        )
+        loaded = load_data()
+        if loaded is None:
+            return
+        data, views = loaded
 
         if data.empty:
             st.warning(
@@ -54,6 +223,9 @@ def render_main():
             )
             return
 
+        # Widget defaults for the Interaktif and Audit tabs
+        min_date, max_date, min_time, max_time = views["bounds"]
+
         # Three tabs: Dashboard, Interaktif, and Audit
         tab_dashboard, tab_interactive, tab_audit = st.tabs([
             "Dashboard",
@@ -65,7 +237,7 @@ def render_main():
             st.header(f"Dashboard - Produk: {st.session_state.active_kode}")
 
             # Dashboard KPIs
-            metrics = get_dashboard_metrics(data)
+            metrics = views["metrics"]
             c1, c2, c3, c4 = st.columns(4)
             c1.metric("Total Rows", metrics.get("total", 0))
             c2.metric("Unique Tujuan", metrics.get("unique_tujuan", 0))
@@ -74,37 +246,15 @@ def render_main():
 
             st.subheader("📊 Summary Matrix")
 
-            styled_summary = get_styled_summary_table(data)
-            st.dataframe(styled_summary, width="stretch", hide_index=True)
+            st.dataframe(views["summary"], width="stretch", hide_index=True)
 
             # Status distribution (bar chart with counts, colored consistently)
-            status_counts = get_status_counts(data)
+            status_counts = views["status_counts"]
             if not status_counts.empty:
-                try:
-                    import plotly.express as px
-
-                    color_map = {
-                        "SUKSES PROFIT": "#1f77b4",
-                        "SUKSES LOSS": "#2a9df4",
-                        "GAGAL A1": "#d62728",
-                    }
-
-                    fig = px.bar(
-                        status_counts,
-                        x="final_status",
-                        y="count",
-                        color="final_status",
-                        color_discrete_map=color_map,
-                        title="Distribusi Final Status (count)",
-                    )
-                    fig.update_traces(texttemplate="%{y}", textposition="outside")
-                    fig.update_layout(
-                        yaxis_title="Count", xaxis_title="", margin=dict(t=30, b=20)
-                    )
+                # Plotly is optional: skip the chart when it isn't installed
+                if px is not None:
+                    fig = build_status_chart(status_counts)
                     st.plotly_chart(fig, width="stretch")
-                except Exception:
-                    # If plotly not available or fails, skip plotting
-                    pass
                 st.divider()
 
         with tab_interactive:
@@ -115,21 +265,25 @@ def render_main():
 
             # Raw data (expandable) - moved to top
             with st.expander("🔽 Raw Data", expanded=False):
-                st.dataframe(data, width="stretch", hide_index=True)
-
-            # Defaults for interactive filters
-            min_date = data["tgl_status"].min()
-            max_date = data["tgl_status"].max()
-            min_time = data["jam_status"].min()
-            max_time = data["jam_status"].max()
-
-            # Initialize variables
-            submitted = False
-            start_date, end_date = min_date, max_date
-            tujuan_val, kode_val = "", ""
-            jam_start, jam_end = min_time, max_time
+                # Only a slice of the rows is sent to the browser
+                max_rows = min(len(data), RAW_DATA_MAX_ROWS)
+                rows_to_show = max_rows
+                if max_rows > 100:
+                    rows_to_show = st.slider(
+                        "Jumlah baris", 100, max_rows, min(1000, max_rows)
+                    )
+                st.dataframe(
+                    data.head(rows_to_show),
+                    width="stretch",
+                    hide_index=True,
+                    column_config=DATA_COLUMN_CONFIG,
+                )
+                if rows_to_show < len(data):
+                    st.caption(f"Menampilkan {rows_to_show} dari {len(data)} baris")
 
-            with st.form("interactive_filters"):
+            # Widget defaults come from the precomputed report bounds, so the
+            # form body does no column scans of its own
+            with st.form("interactive_filters", clear_on_submit=False):
                 col1, col2 = st.columns(2)
                 with col1:
                     start_date = st.date_input(
@@ -169,43 +323,36 @@ def render_main():
                 if jam_start and jam_end and jam_start > jam_end:
                     st.error("Jam awal tidak boleh lebih besar dari jam akhir!")
                 else:
-                    filtered_local = data.copy()
-                    # Date filter
-                    filtered_local = filtered_local[
-                        (filtered_local["tgl_status"] >= start_date)
-                        & (filtered_local["tgl_status"] <= end_date)
-                    ]
+                    # Combine every filter into one mask and slice once
+                    mask = datetime_window_mask(
+                        data["tgl_status"], start_date, end_date, jam_start, jam_end
+                    )
 
-                    # Tujuan filter
+                    # Tujuan filter (plain substring, not a regex)
                     if tujuan_val:
-                        filtered_local = filtered_local[
-                            filtered_local["tujuan"].str.contains(
-                                tujuan_val, case=False, na=False
-                            )
-                        ]
+                        mask &= (
+                            data["tujuan"]
+                            .str.contains(tujuan_val, case=False, na=False, regex=False)
+                            .to_numpy(dtype=bool)
+                        )
 
                     # Kode produk filter
                     if kode_val:
-                        filtered_local = filtered_local[
-                            filtered_local["kode_produk"].str.contains(
-                                kode_val, case=False, na=False
-                            )
-                        ]
+                        mask &= kode_produk_mask(data["kode_produk"], kode_val)
 
                     # Status filter
                     if status_val:
-                        filtered_local = filtered_local[
-                            filtered_local["final_status"].isin(status_val)
-                        ]
-
-                    # Time filter
-                    filtered_local = filtered_local[
-                        (filtered_local["jam_status"] >= jam_start)
-                        & (filtered_local["jam_status"] <= jam_end)
-                    ]
+                        mask &= final_status_mask(data["final_status"], status_val)
+
+                    filtered_local = data.loc[mask]
 
                     st.subheader(f"Hasil Filter: {len(filtered_local)} baris")
-                    st.dataframe(filtered_local, width="stretch", hide_index=True)
+                    st.dataframe(
+                        filtered_local,
+                        width="stretch",
+                        hide_index=True,
+                        column_config=DATA_COLUMN_CONFIG,
+                    )
             else:
                 st.info(
                     "Terapkan filter di form dan klik 'Apply Filters' untuk melihat hasilnya."
@@ -218,25 +365,22 @@ def render_main():
             )
 
             # Check if there's synchronized audit data
-            if (
-                "audit_sync_data" in st.session_state
-                and not st.session_state.audit_sync_data.empty
-            ):
+            audit_data = get_audit_sync_data()
+            if audit_data is not None and not audit_data.empty:
                 st.subheader("📋 Data Audit Tersinkronisasi")
-                audit_data = st.session_state.audit_sync_data
 
                 # Display summary metrics
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
                     st.metric("Total Audit", len(audit_data))
                 with col2:
-                    success_count = len(
-                        audit_data[audit_data["final_status"] == "SUKSES PROFIT"]
+                    success_count = int(
+                        np.count_nonzero(audit_data["final_status"] == "SUKSES PROFIT")
                     )
                     st.metric("Sukses Audit", success_count)
                 with col3:
-                    error_count = len(
-                        audit_data[audit_data["final_status"] == "GAGAL A1"]
+                    error_count = int(
+                        np.count_nonzero(audit_data["final_status"] == "GAGAL A1")
                     )
                     st.metric("Gagal Audit", error_count)
                 with col4:
@@ -248,33 +392,20 @@ def render_main():
 
                 st.divider()
 
-            # Initialize variables
-            submitted_audit = False
-            start_date_audit, end_date_audit = (
-                data["tgl_status"].min(),
-                data["tgl_status"].max(),
-            )
-            jam_start_audit, jam_end_audit = (
-                data["jam_status"].min(),
-                data["jam_status"].max(),
-            )
-            saldo_awal, saldo_akhir = 0, 0
-            harga_produk = 1000
-
-            with st.form("audit_form"):
+            with st.form("audit_form", clear_on_submit=False):
                 col1, col2 = st.columns(2)
                 with col1:
                     start_date_audit = st.date_input(
-                        "Tanggal Awal", value=start_date_audit, key="audit_start_date"
+                        "Tanggal Awal", value=min_date, key="audit_start_date"
                     )
                     end_date_audit = st.date_input(
-                        "Tanggal Akhir", value=end_date_audit, key="audit_end_date"
+                        "Tanggal Akhir", value=max_date, key="audit_end_date"
                     )
                     jam_start_audit = st.time_input(
-                        "Jam Mulai", value=jam_start_audit, key="audit_jam_start"
+                        "Jam Mulai", value=min_time, key="audit_jam_start"
                     )
                     jam_end_audit = st.time_input(
-                        "Jam Akhir", value=jam_end_audit, key="audit_jam_end"
+                        "Jam Akhir", value=max_time, key="audit_jam_end"
                     )
                 with col2:
                     kode_produk_audit = st.text_input(
@@ -303,35 +434,24 @@ def render_main():
                 ):
                     st.error("Jam awal tidak boleh lebih besar dari jam akhir!")
                 else:
-                    # Filter data for audit calculations
-                    audit_data = data.copy()
+                    # Filter data for audit calculations with a single mask
+                    mask = datetime_window_mask(
+                        data["tgl_status"],
+                        start_date_audit,
+                        end_date_audit,
+                        jam_start_audit,
+                        jam_end_audit,
+                    )
 
                     # Apply kode_produk filter if specified
                     if kode_produk_audit:
-                        audit_data = audit_data[
-                            audit_data["kode_produk"].str.contains(
-                                kode_produk_audit, case=False, na=False
-                            )
-                        ]
-
-                    # Apply date and time filters
-                    audit_data = audit_data[
-                        (audit_data["tgl_status"] >= start_date_audit)
-                        & (audit_data["tgl_status"] <= end_date_audit)
-                        & (audit_data["jam_status"] >= jam_start_audit)
-                        & (audit_data["jam_status"] <= jam_end_audit)
-                    ]
+                        mask &= kode_produk_mask(data["kode_produk"], kode_produk_audit)
 
-                    # Calculate totals
-                    total_sukses = audit_data[
-                        audit_data["final_status"].isin([
-                            "SUKSES PROFIT",
-                            "SUKSES LOSS",
-                        ])
-                    ].shape[0]
-                    total_gagal = audit_data[
-                        audit_data["final_status"] == "GAGAL A1"
-                    ].shape[0]
+                    # Calculate totals straight from the mask and the
+                    # final_status category codes, without slicing the data
+                    counts = count_final_status(data["final_status"], mask)
+                    total_sukses = int(counts["SUKSES PROFIT"] + counts["SUKSES LOSS"])
+                    total_gagal = int(counts["GAGAL A1"])
 
                     # Calculate monetary values
                     nilai_sukses = total_sukses * harga_produk
@@ -339,44 +459,39 @@ def render_main():
                     expected_usage = saldo_awal - saldo_akhir
                     selisih = expected_usage - nilai_sukses
 
-                    # Determine status with color
-                    if abs(selisih) <= (nilai_sukses * 0.05):  # 5% tolerance
-                        status_text = "COCOK"
-                        status_color = "green"
-                    else:
-                        status_text = "SELISIH"
-                        status_color = "red"
+                    # Determine status with color (5% tolerance)
+                    status_text, status_color = AUDIT_STATUS[
+                        abs(selisih) <= nilai_sukses * 0.05
+                    ]
 
                     # Display results in matrix format
                     st.subheader("📊 Hasil Audit")
 
                     # Create matrix data
+                    nilai_sukses_rp = format_rupiah(nilai_sukses)
                     matrix_data = [
-                        ["Total Sukses", f"{total_sukses} transaksi"],
-                        ["Total Gagal", f"{total_gagal} transaksi"],
-                        ["Nilai Sukses", f"Rp {nilai_sukses:,.0f}"],
-                        ["Nilai Refund", f"Rp {nilai_refund:,.0f}"],
-                        ["Expected Usage", f"Rp {expected_usage:,.0f}"],
-                        ["Actual Usage", f"Rp {nilai_sukses:,.0f}"],
-                        ["Selisih", f"Rp {selisih:,.0f}"],
-                        [
+                        ("Total Sukses", f"{total_sukses} transaksi"),
+                        ("Total Gagal", f"{total_gagal} transaksi"),
+                        ("Nilai Sukses", nilai_sukses_rp),
+                        ("Nilai Refund", format_rupiah(nilai_refund)),
+                        ("Expected Usage", format_rupiah(expected_usage)),
+                        ("Actual Usage", nilai_sukses_rp),
+                        ("Selisih", format_rupiah(selisih)),
+                        (
                             "Status",
                             f"<span style='color: {status_color}; font-weight: bold;'>{status_text}</span>",
-                        ],
+                        ),
                     ]
 
-                    # Display as matrix
-                    for i, (label, value) in enumerate(matrix_data):
-                        if i % 2 == 0:
-                            col1, col2 = st.columns(2)
-
-                        with col1:
-                            st.write(f"**{label}:**")
-                        with col2:
-                            if "Status" in label and "<span" in value:
-                                st.markdown(value, unsafe_allow_html=True)
-                            else:
-                                st.write(value)
+                    # Display as a single markdown table (one element, not
+                    # a pair of columns per row)
+                    rows = "\n".join(
+                        f"| **{label}** | {value} |" for label, value in matrix_data
+                    )
+                    st.markdown(
+                        "| Keterangan | Nilai |\n|---|---|\n" + rows,
+                        unsafe_allow_html=True,
+                    )
 
     else:
         st.info("Silahkan masukkan Kode Produk di sidebar dan klik 'Terapkan Filter'")
@@ -1,26 +1,78 @@
-import json
+import io
 from datetime import datetime
 
 import pandas as pd
 import streamlit as st
 
 from services.audit import (
+    CHECK_CACHE_TTL,
+    PHONE_PATTERN,
+    RESULTS_WINDOW,
     AuditQueueManager,
 )
 
 st.set_page_config(page_title="Rekap RGU - Audit", page_icon="🔍", layout="wide")
 
 # Session init
-if "audit_data_source" not in st.session_state:
-    st.session_state.audit_data_source = "manual"
-if "audit_results" not in st.session_state:
-    st.session_state.audit_results = []
-if "selected_dataframe" not in st.session_state:
-    st.session_state.selected_dataframe = None
-if "available_dataframes" not in st.session_state:
-    st.session_state.available_dataframes = []
-if "uploaded_data" not in st.session_state:
-    st.session_state.uploaded_data = None
+for key, default in {
+    "audit_data_source": "manual",
+    "audit_results": [],
+    "selected_dataframe": None,
+    "available_dataframes": [],
+    "uploaded_data": None,
+}.items():
+    st.session_state.setdefault(key, default)
+
+
+@st.cache_data(show_spinner=False)
+def parse_uploaded_txt(file_bytes, delimiter):
+    """Parse uploaded TXT bytes; cached so reruns skip re-reading the file.
+
+    Only the first column (the numbers) is parsed, as strings so leading
+    zeros survive.
+    """
+    return pd.read_csv(
+        io.BytesIO(file_bytes),
+        sep=delimiter,
+        header=None,
+        usecols=[0],
+        names=["nomor"],
+        dtype=str,
+    )
+
+
+def get_filtered_results(qm, load_all, status_filter):
+    """Filtered results and their DataFrame, rebuilt only when results change.
+
+    Kept in session_state rather than st.cache_data since results belong to
+    one session; the manager's running result count versions the entry.
+    """
+    key = (
+        id(qm),
+        qm.processed_count + qm.skip_count + qm.error_count,
+        load_all,
+        tuple(status_filter),
+    )
+    cached = st.session_state.get("results_frame_cache")
+    if cached is None or cached[0] != key:
+        results = qm.load_all_results() if load_all else qm.get_recent_results()
+
+        # Apply filters
+        if status_filter != ["Semua"]:
+            results = [r for r in results if r.get("status") in status_filter]
+
+        cached = (key, results, pd.DataFrame(results))
+        st.session_state.results_frame_cache = cached
+    return cached[1], cached[2]
+
+
+def get_results_csv(results_df):
+    """CSV bytes for a results frame, encoded once per frame."""
+    cached = st.session_state.get("results_csv_cache")
+    if cached is None or cached[0] is not results_df:
+        cached = (results_df, results_df.to_csv(index=False).encode())
+        st.session_state.results_csv_cache = cached
+    return cached[1]
 
 
 def render():
@@ -37,10 +89,6 @@ def render():
         )
 
         if data_source == "Pilih dari DataFrame":
-            # Get available dataframes from session state
-            if "available_dataframes" not in st.session_state:
-                st.session_state.available_dataframes = []
-
             # Add option to select from existing dataframes
             if st.session_state.available_dataframes:
                 st.selectbox(
@@ -57,12 +105,11 @@ def render():
                 # Read and process uploaded file
                 stringio = st.text_input("Masukkan delimiter", value=",")
                 try:
-                    df = pd.read_csv(uploaded_file, sep=stringio, header=None)
+                    df = parse_uploaded_txt(uploaded_file.getvalue(), stringio)
                     st.success(f"File berhasil diupload: {len(df)} baris")
 
                     # Store in session state
-                    if "uploaded_data" not in st.session_state:
-                        st.session_state.uploaded_data = df
+                    st.session_state.uploaded_data = df
                 except Exception as e:
                     st.error(f"Error membaca file: {str(e)}")
             else:
@@ -112,6 +159,16 @@ def render():
                 "Jeda per kirim (detik)", min_value=1, value=30
             )
             max_queue = st.number_input("Max antrian", min_value=1, value=10)
+            concurrency = st.number_input(
+                "Request paralel", min_value=1, max_value=16, value=1
+            )
+            cache_ttl = st.number_input(
+                "Cache hasil (detik)",
+                min_value=0,
+                value=CHECK_CACHE_TTL,
+                help="Nomor yang sudah sukses dicek dalam jangka waktu ini "
+                "memakai hasil sebelumnya (kolom 'cached'). 0 = selalu cek ulang",
+            )
 
         identifier_paket = st.text_input(
             "Identifier Paket", value="Freedom Internet 1.5GB/1Hari"
@@ -126,16 +183,18 @@ def render():
                 # Initialize audit queue manager if not exists
                 if "audit_queue_manager" not in st.session_state:
                     st.session_state.audit_queue_manager = AuditQueueManager(
-                        delay_seconds, max_queue
+                        delay_seconds, max_queue, concurrency, cache_ttl
                     )
+                st.session_state.audit_queue_manager.cache_ttl = cache_ttl
 
-                # Add numbers to queue from selected data source
-                if data_source == "Manual Input":
-                    numbers = st.session_state.uploaded_data["nomor"].tolist()
-                elif data_source == "Upload TXT":
-                    numbers = st.session_state.uploaded_data["nomor"].tolist()
-                else:
-                    numbers = []
+                # Add numbers to queue from selected data source, dropping
+                # malformed numbers before they cost an API round-trip
+                nomor = st.session_state.uploaded_data["nomor"].astype(str)
+                valid = nomor.str.fullmatch(PHONE_PATTERN)
+                numbers = nomor[valid].tolist()
+                invalid = len(nomor) - len(numbers)
+                if invalid:
+                    st.warning(f"Skipped {invalid} invalid numbers")
 
                 added = 0
                 for n in numbers:
@@ -179,7 +238,7 @@ def render():
             st.subheader("📊 Progress Tracking")
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Queue Size", qm.queue.qsize())
+                st.metric("Queue Size", len(qm.queue))
             with col2:
                 st.metric("Processed", qm.processed_count)
             with col3:
@@ -187,12 +246,18 @@ def render():
             with col4:
                 st.metric("Errors", qm.error_count)
 
+        if qm.spill_error:
+            st.warning(
+                f"Gagal menyimpan hasil ke file ({qm.spill_error}). "
+                "Hasil disimpan sementara di memori dan akan dicoba lagi."
+            )
+
     # Results
     if (
         "audit_queue_manager" in st.session_state
         and st.session_state.audit_queue_manager.results
     ):
-        results = st.session_state.audit_queue_manager.results
+        qm = st.session_state.audit_queue_manager
         st.subheader("📋 Hasil Audit")
 
         # Filter options
@@ -203,20 +268,16 @@ def render():
                 key="status_filter",
                 default=["Semua"],
             )
+            load_all = st.checkbox(
+                "Muat semua hasil",
+                help=f"Tanpa opsi ini hanya {RESULTS_WINDOW} hasil terakhir "
+                "yang ditampilkan dan diexport",
+            )
 
-        # Apply filters
-        if status_filter != ["Semua"]:
-            filtered_results = [
-                r
-                for r in results
-                if status_filter == ["Semua"] or r.get("status") in status_filter
-            ]
-        else:
-            filtered_results = results
+        filtered_results, results_df = get_filtered_results(qm, load_all, status_filter)
 
         # Display results
         if filtered_results:
-            results_df = pd.DataFrame(filtered_results)
             st.dataframe(results_df, width="stretch", hide_index=True)
 
             # Summary metrics
@@ -242,15 +303,11 @@ def render():
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("Export to JSON"):
-                filename = (
-                    f"audit_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                )
-                with open(filename, "w", encoding="utf-8") as f:
-                    json.dump(filtered_results, f, indent=2, default=str)
+                filename = qm.save_results_to_json(filtered_results)
                 st.success(f"Results saved to {filename}")
         with col2:
             if st.button("Export to CSV"):
-                csv = pd.DataFrame(filtered_results).to_csv(index=False)
+                csv = get_results_csv(results_df)
                 st.download_button(
                     "Download CSV",
                     csv,
@@ -260,17 +317,11 @@ def render():
         with col3:
             if st.button("Sinkronkan ke Report"):
                 # Create synchronized dataframe
-                qm = st.session_state.audit_queue_manager
                 sync_df = qm.create_synchronized_dataframe(filtered_results)
 
-                # Store in session state for use in report page
-                if "audit_sync_data" not in st.session_state:
-                    st.session_state.audit_sync_data = sync_df
-                else:
-                    # Append to existing data
-                    st.session_state.audit_sync_data = pd.concat(
-                        [st.session_state.audit_sync_data, sync_df], ignore_index=True
-                    )
+                # Store in session state for use in report page; chunks are
+                # only concatenated when the report page reads them
+                st.session_state.setdefault("audit_sync_chunks", []).append(sync_df)
 
                 st.success(f"Berhasil menyinkronkan {len(sync_df)} data ke Report")
                 st.info("Data tersedia di halaman Report pada tab 'Audit'")
@@ -1,113 +1,498 @@
 import json
+import re
 import threading
 import time
+from collections import Counter, deque
 from datetime import datetime
-from queue import Queue
 
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encode/decode when installed
+    orjson = None
+
+
+def _loads_json(raw):
+    """Decode a JSON payload (bytes or str), using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dumps_json(obj):
+    """Encode one object as compact JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=str).encode()
+
+
+def _dumps_json_line(obj):
+    """Encode one object as a JSON Lines record (bytes)."""
+    return _dumps_json(obj) + b"\n"
+
+
+# Accepted phone number format; anything else is rejected before queueing
+PHONE_PATTERN = r"\+?\d{8,15}"
+_PHONE_RE = re.compile(PHONE_PATTERN)
+
+# Seconds to wait for the TCP/TLS connect, and for the API's reply to a check
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+# Adaptive rate: 429/5xx halves the send rate, down to 1/RATE_BACKOFF_LIMIT of
+# the configured rate; RATE_RECOVER_AFTER straight 200s double it back
+RATE_BACKOFF_LIMIT = 8
+RATE_RECOVER_AFTER = 5
+# Minimum seconds between reachability probes while the API is marked down
+REPROBE_INTERVAL = 60
+# Consecutive timeouts/connection errors before the API is marked down
+UNREACHABLE_AFTER = 3
+# Default seconds a successful check is reused, and the most entries kept
+CHECK_CACHE_TTL = 600
+CHECK_CACHE_SIZE = 4096
+# Fixed fields of the error results returned by _check_single_number
+_UNREACHABLE_RESULT = {
+    "error": "API unreachable",
+    "status": "skipped",
+    "message": "Cannot reach API endpoint",
+}
+_INVALID_JSON_RESULT = {
+    "error": "Invalid JSON response",
+    "status": "skipped",
+    "message": "JSON parsing failed",
+}
+_TIMEOUT_RESULT = {
+    "error": "Request timeout",
+    "status": "skipped",
+    "message": f"Request timed out after {READ_TIMEOUT} seconds",
+}
+_CONNECTION_ERROR_RESULT = {
+    "error": "Connection error",
+    "status": "skipped",
+    "message": "Failed to connect to API",
+}
+# Most recent results kept in memory; the full history lives in the spill file
+RESULTS_WINDOW = 1000
+# Results buffered before being appended to the spill file
+SPILL_BATCH = 50
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens/second, bursts of ``capacity``"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if one is available.
+
+        Returns 0.0 on success, otherwise the seconds until the next token.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+def make_parser(identifier_kartu, identifier_paket):
+    """Build a response parser specialized for one identifier pair.
+
+    The identifiers are fixed for a whole audit run, so they are lowercased
+    once here instead of on every response.
+    """
+    kartu_lower = identifier_kartu.lower()
+    paket_lower = identifier_paket.lower()
+
+    def parse(response_json):
+        """Parse API response and extract required information"""
+
+        # Normalize MSISDN
+        msisdn = response_json.get("msisdn", "")
+        if isinstance(msisdn, str) and msisdn.startswith("62"):
+            msisdn = "0" + msisdn[2:]
+
+        # Extract balance
+        balance = response_json.get("custbalanceinfo", "0")
+
+        # Initialize default values
+        kartu = act_kartu = end_kartu = paket = act_paket = end_paket = None
+
+        # Parse services (first matching package wins for each identifier)
+        services = response_json.get("Services", []) or []
+        for service in services:
+            package_name = service.get("packagename", "")
+            package_name_lower = package_name.lower()
+
+            if kartu is None and kartu_lower in package_name_lower:
+                kartu = package_name
+                act_kartu = service.get("activationdate", "")
+                end_kartu = service.get("enddate", "")
+
+            if paket is None and paket_lower in package_name_lower:
+                paket = package_name
+                act_paket = service.get("activationdate", "")
+                end_paket = service.get("enddate", "")
+
+            if kartu is not None and paket is not None:
+                break
+
+        # Extract additional information
+        status_info = response_json.get("statusinfo", {})
+        expiry_date = status_info.get("expirydate", "")
+        activation_date = status_info.get("activationdate", "")
+
+        return {
+            "nomor": msisdn,
+            "kartu": kartu,
+            "act_kartu": act_kartu,
+            "end_kartu": end_kartu,
+            "paket": paket,
+            "act_paket": act_paket,
+            "end_paket": end_paket,
+            "balance": balance,
+            "expiry_date": expiry_date,
+            "activation_date": activation_date,
+            "status_info": status_info,
+        }
+
+    return parse
 
 
 class AuditQueueManager:
     """Queue manager for audit API requests with error handling and rate limiting"""
 
-    def __init__(self, delay_seconds=30, max_queue=10):
+    def __init__(
+        self, delay_seconds=30, max_queue=10, concurrency=1, cache_ttl=CHECK_CACHE_TTL
+    ):
         self.delay_seconds = delay_seconds
         self.max_queue = max_queue
-        self.queue = Queue(maxsize=max_queue)
-        self.results = []
+        # Number of requests allowed in flight at once (one worker thread each)
+        self.concurrency = max(1, int(concurrency))
+        # Plain deque: append/popleft are atomic, workers are woken via an Event
+        self.queue = deque()
+        self._has_items = threading.Event()
+        # Set while not paused; paused workers block on it instead of polling
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        # Set by stop_processing so workers waiting for a send token exit at once
+        self._stop_event = threading.Event()
+        # One send per delay_seconds per worker, shared across all workers
+        self._rate_limiter = (
+            TokenBucket(self.concurrency / delay_seconds, self.concurrency)
+            if delay_seconds > 0
+            else None
+        )
+        self._ok_streak = 0
+        # Bounded window of recent results; every result is also spilled
+        # to the JSON Lines file at results_file
+        self.results = deque(maxlen=RESULTS_WINDOW)
+        self.results_file = None
+        self._spill_buffer = []
+        # Last error writing the spill file, or None; unwritten results stay
+        # buffered and are retried with the next batch
+        self.spill_error = None
         self.is_running = False
         self.is_paused = False
         self.processed_count = 0
         self.error_count = 0
         self.skip_count = 0
-        self.thread = None
+        self.threads = []
+        self._lock = threading.Lock()
+        self.session = self._create_session()
+        # Successful checks are reused for cache_ttl seconds (0 disables it)
+        # so re-queued numbers don't hit the API (and the parser) again;
+        # maps the check parameters to (time stored, parsed result). Age is
+        # checked against the current cache_ttl, so lowering it takes effect
+        # for entries that are already stored
+        self.cache_ttl = cache_ttl
+        self._check_cache = {}
+        # Response parser for the current run, built by start_processing
+        self._parse = None
+        # API reachability, probed once per run and again only after
+        # UNREACHABLE_AFTER straight connection failures (at most every
+        # REPROBE_INTERVAL seconds)
+        self._api_ok = False
+        self._fail_streak = 0
+        self._last_probe = float("-inf")
+        self._probe_lock = threading.Lock()
+
+    def _create_session(self):
+        """Create a pooled HTTP session so connections are kept alive between checks"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.concurrency,
+            # Only failed connects are retried, since no request reached the
+            # API yet. A read timeout or an error status is returned as is:
+            # one check stays one request, and _adapt_rate sees every 429/5xx
+            max_retries=Retry(
+                total=3,
+                read=False,
+                backoff_factor=0.5,
+                respect_retry_after_header=False,
+            ),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
 
     def add_to_queue(self, phone_number):
-        """Add phone number to queue"""
-        try:
-            self.queue.put(phone_number, timeout=1)
-            return True
-        except Exception:
+        """Add phone number to queue; invalid numbers are rejected"""
+        if len(self.queue) >= self.max_queue:
+            return False
+        if not _PHONE_RE.fullmatch(str(phone_number)):
             return False
+        self.queue.append(phone_number)
+        self._has_items.set()
+        return True
 
     def start_processing(self, api_url, identifier_kartu, identifier_paket, username):
         """Start processing queue"""
         if not self.is_running:
             self.is_running = True
             self.is_paused = False
-            self.thread = threading.Thread(
-                target=self._process_queue,
-                args=(api_url, identifier_kartu, identifier_paket, username),
-            )
-            self.thread.daemon = True
-            self.thread.start()
+            self._resume_event.set()
+            self._stop_event.clear()
+            self._parse = make_parser(identifier_kartu, identifier_paket)
+            self._api_ok = False
+            self._last_probe = float("-inf")
+            self._fail_streak = 0
+            self.threads = []
+            for _ in range(self.concurrency):
+                thread = threading.Thread(
+                    target=self._process_queue,
+                    args=(api_url, identifier_kartu, identifier_paket, username),
+                )
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
 
     def pause_processing(self):
         """Pause processing"""
         self.is_paused = True
+        self._resume_event.clear()
 
     def resume_processing(self):
         """Resume processing"""
         self.is_paused = False
+        self._resume_event.set()
 
     def stop_processing(self):
         """Stop processing"""
         self.is_running = False
-        if self.thread:
-            self.thread.join(timeout=2)
+        # Wake up idle, paused and throttled workers so they can exit
+        self._stop_event.set()
+        self._has_items.set()
+        self._resume_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        with self._lock:
+            self._flush_results()
+        self.close()
+
+    def close(self):
+        """Release pooled connections; the session reconnects on next use"""
+        self.session.close()
+
+    def _record_result(self, result):
+        """Store a result and update counters (shared by all worker threads)"""
+        with self._lock:
+            if result.get("status") == "success":
+                self.processed_count += 1
+            elif result.get("status") == "skipped":
+                self.skip_count += 1
+            else:
+                self.error_count += 1
+
+            self.results.append(result)
+            self._spill_buffer.append(result)
+            if len(self._spill_buffer) % SPILL_BATCH == 0:
+                self._flush_results()
+
+    def _adapt_rate(self, status_code):
+        """Back off the shared send rate on 429/5xx and recover it on 200s"""
+        limiter = self._rate_limiter
+        if limiter is None:
+            return
+        base_rate = self.concurrency / self.delay_seconds
+        with self._lock:
+            if status_code == 429 or status_code >= 500:
+                self._ok_streak = 0
+                limiter.rate = max(base_rate / RATE_BACKOFF_LIMIT, limiter.rate / 2)
+            elif status_code == 200 and limiter.rate < base_rate:
+                self._ok_streak += 1
+                if self._ok_streak >= RATE_RECOVER_AFTER:
+                    self._ok_streak = 0
+                    limiter.rate = min(base_rate, limiter.rate * 2)
+
+    def _cached_check(self, key):
+        """A still-fresh cached result for key, marked as cached, or None"""
+        with self._lock:
+            entry = self._check_cache.get(key)
+            if entry is None:
+                return None
+            stored, result = entry
+            if time.monotonic() - stored >= self.cache_ttl:
+                del self._check_cache[key]
+                return None
+        return {**result, "cached": True}
+
+    def _store_check(self, key, result):
+        """Cache a successful result, evicting expired then oldest entries"""
+        if self.cache_ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._check_cache) >= CHECK_CACHE_SIZE:
+                self._check_cache = {
+                    k: entry
+                    for k, entry in self._check_cache.items()
+                    if now - entry[0] < self.cache_ttl
+                }
+                while len(self._check_cache) >= CHECK_CACHE_SIZE:
+                    del self._check_cache[next(iter(self._check_cache))]
+            self._check_cache[key] = (now, result)
+
+    def _flush_results(self):
+        """Append buffered results to the spill file (caller holds _lock).
+
+        A failed write (unwritable directory, full disk) keeps the buffer and
+        sets spill_error instead of raising into the worker thread.
+        """
+        if not self._spill_buffer:
+            return
+        if self.results_file is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.results_file = f"audit_results_{timestamp}.jsonl"
+        try:
+            with open(self.results_file, "ab") as f:
+                f.writelines(_dumps_json_line(result) for result in self._spill_buffer)
+        except OSError as e:
+            self.spill_error = f"{self.results_file}: {e}"
+            return
+        self.spill_error = None
+        self._spill_buffer.clear()
+
+    def get_recent_results(self):
+        """Snapshot of the in-memory result window"""
+        with self._lock:
+            return list(self.results)
+
+    def load_all_results(self):
+        """Return every result recorded so far, read back from the spill file"""
+        with self._lock:
+            self._flush_results()
+            results = []
+            if self.results_file is not None:
+                try:
+                    with open(self.results_file, "rb") as f:
+                        results = [_loads_json(line) for line in f if line.strip()]
+                except OSError as e:
+                    self.spill_error = f"{self.results_file}: {e}"
+            # Results the spill file could not take are still buffered
+            return results + self._spill_buffer
 
     def _process_queue(self, api_url, identifier_kartu, identifier_paket, username):
-        """Internal queue processing method with error handling"""
+        """Internal queue processing method with error handling.
+
+        Runs in each worker thread; all workers draw from one shared token
+        bucket, so the overall send rate is ``concurrency / delay_seconds``.
+        """
         while self.is_running:
-            if not self.is_paused and not self.queue.empty():
-                try:
-                    phone_number = self.queue.get(timeout=1)
-                    result = self._check_single_number(
-                        phone_number,
-                        api_url,
-                        identifier_kartu,
-                        identifier_paket,
-                        username,
-                    )
-                    self.results.append(result)
-
-                    if result.get("status") == "success":
-                        self.processed_count += 1
-                    elif result.get("status") == "skipped":
-                        self.skip_count += 1
-                    else:
-                        self.error_count += 1
-
-                    time.sleep(self.delay_seconds)
-                except Exception as e:
-                    error_result = {
-                        "nomor": phone_number  # type: ignore
-                        if "phone_number" in locals()
-                        else "unknown",
-                        "error": str(e),
-                        "status": "queue_error",
-                    }
-                    self.results.append(error_result)
-                    self.error_count += 1
-                finally:
-                    try:
-                        self.queue.task_done()
-                    except Exception:
-                        pass
-            elif self.is_paused:
-                time.sleep(1)  # Wait when paused
-            elif self.queue.empty():
-                time.sleep(1)  # Wait for new items
-            else:
-                time.sleep(0.1)  # Brief pause
+            if self.is_paused:
+                self._resume_event.wait()  # Block until resumed or stopped
+                continue
+
+            if not self.queue:
+                # Queue drained: block until add_to_queue signals new items.
+                # Re-check after clearing so an item added in between isn't missed.
+                self._has_items.clear()
+                if not self.queue:
+                    self._has_items.wait(timeout=1)
+                continue
+
+            # Wait for a send token; stop interrupts the wait, and pause is
+            # re-checked before the token is taken
+            if self._rate_limiter is not None:
+                wait = self._rate_limiter.try_acquire()
+                if wait > 0:
+                    self._stop_event.wait(wait)
+                    continue
+
+            try:
+                phone_number = self.queue.popleft()
+            except IndexError:
+                continue  # Another worker took the last item
+
+            try:
+                result = self._check_single_number(
+                    phone_number,
+                    api_url,
+                    identifier_kartu,
+                    identifier_paket,
+                    username,
+                )
+            except Exception as e:
+                result = {
+                    "nomor": phone_number,
+                    "error": str(e),
+                    "status": "queue_error",
+                }
+            # Recorded exactly once, outside the try: _record_result doesn't
+            # raise on spill write errors, so the worker keeps running
+            self._record_result(result)
+
+    def _note_request_outcome(self, failed):
+        """Track straight connection failures; enough of them mark the API down.
+
+        One slow or dropped request says little about the API as a whole,
+        so the remaining numbers are only skipped once failures repeat.
+        """
+        with self._lock:
+            if not failed:
+                self._fail_streak = 0
+                return
+            self._fail_streak += 1
+            if self._fail_streak >= UNREACHABLE_AFTER:
+                self._fail_streak = 0
+                self._api_ok = False  # Skip until the next probe succeeds
+
+    def _api_available(self, api_url, username):
+        """Whether the API is up, probing it only when it is marked down.
+
+        The probe runs under a lock, so other workers wait for its outcome
+        instead of sending their own.
+        """
+        with self._probe_lock:
+            if (
+                not self._api_ok
+                and time.monotonic() - self._last_probe >= REPROBE_INTERVAL
+            ):
+                self._api_ok = self.check_api_reachability(api_url, username)
+                self._last_probe = time.monotonic()
+            return self._api_ok
 
     def check_api_reachability(self, api_url, username):
         """Check if API is reachable before processing"""
         try:
             # Simple ping to check if API is reachable
             test_params = {"username": username, "to": "TEST"}
-            response = requests.get(api_url, params=test_params, timeout=10)
+            response = self.session.get(
+                api_url, params=test_params, timeout=(CONNECT_TIMEOUT, 10)
+            )
             return response.status_code == 200
         except Exception:
             return False
@@ -116,19 +501,29 @@ class AuditQueueManager:
         self, phone_number, api_url, identifier_kartu, identifier_paket, username
     ):
         """Check single number via API with robust error handling"""
-        # Check API reachability first
-        if not self.check_api_reachability(api_url, username):
-            return {
-                "nomor": phone_number,
-                "error": "API unreachable",
-                "status": "skipped",
-                "message": "Cannot reach API endpoint",
-            }
+        cache_key = (
+            phone_number,
+            api_url,
+            identifier_kartu,
+            identifier_paket,
+            username,
+        )
+        cached = self._cached_check(cache_key)
+        if cached is not None:
+            return cached
+
+        # Skip without a request while the API is known to be down
+        if not self._api_available(api_url, username):
+            return {"nomor": phone_number, **_UNREACHABLE_RESULT}
 
         try:
             params = {"username": username, "to": phone_number}
 
-            response = requests.get(api_url, params=params, timeout=30)
+            response = self.session.get(
+                api_url, params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+            )
+            self._note_request_outcome(failed=False)
+            self._adapt_rate(response.status_code)
 
             # Skip invalid responses but continue processing
             if response.status_code != 200:
@@ -140,38 +535,26 @@ class AuditQueueManager:
                 }
 
             try:
-                response_data = response.json()
-            except json.JSONDecodeError:
-                return {
-                    "nomor": phone_number,
-                    "error": "Invalid JSON response",
-                    "status": "skipped",
-                    "message": "JSON parsing failed",
-                }
+                response_data = _loads_json(response.content)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return {"nomor": phone_number, **_INVALID_JSON_RESULT}
 
             # Parse response
-            parsed_data = self.parse_api_response(
-                response_data, identifier_kartu, identifier_paket
-            )
+            parsed_data = self._parse(response_data)
             parsed_data["status"] = "success"
+            parsed_data["cached"] = False
             parsed_data["raw_response"] = response_data
 
-            return parsed_data
+            self._store_check(cache_key, parsed_data)
+
+            return dict(parsed_data)
 
         except requests.exceptions.Timeout:
-            return {
-                "nomor": phone_number,
-                "error": "Request timeout",
-                "status": "skipped",
-                "message": "Request timed out after 30 seconds",
-            }
+            self._note_request_outcome(failed=True)
+            return {"nomor": phone_number, **_TIMEOUT_RESULT}
         except requests.exceptions.ConnectionError:
-            return {
-                "nomor": phone_number,
-                "error": "Connection error",
-                "status": "skipped",
-                "message": "Failed to connect to API",
-            }
+            self._note_request_outcome(failed=True)
+            return {"nomor": phone_number, **_CONNECTION_ERROR_RESULT}
         except requests.exceptions.RequestException as e:
             return {
                 "nomor": phone_number,
@@ -189,156 +572,113 @@ class AuditQueueManager:
 
     def parse_api_response(self, response_json, identifier_kartu, identifier_paket):
         """Parse API response and extract required information"""
-
-        # Normalize MSISDN
-        msisdn = response_json.get("msisdn", "")
-        if isinstance(msisdn, str) and msisdn.startswith("62"):
-            msisdn = "0" + msisdn[2:]
-
-        # Extract balance
-        balance = response_json.get("custbalanceinfo", "0")
-
-        # Initialize default values
-        kartu = act_kartu = end_kartu = paket = act_paket = end_paket = None
-
-        # Parse services
-        services = response_json.get("Services", []) or []
-        for service in services:
-            package_name = service.get("packagename", "")
-
-            if identifier_kartu.lower() in package_name.lower():
-                kartu = package_name
-                act_kartu = service.get("activationdate", "")
-                end_kartu = service.get("enddate", "")
-
-            if identifier_paket.lower() in package_name.lower():
-                paket = package_name
-                act_paket = service.get("activationdate", "")
-                end_paket = service.get("enddate", "")
-
-        # Extract additional information
-        status_info = response_json.get("statusinfo", {})
-        expiry_date = status_info.get("expirydate", "")
-        activation_date = status_info.get("activationdate", "")
-
-        return {
-            "nomor": msisdn,
-            "kartu": kartu,
-            "act_kartu": act_kartu,
-            "end_kartu": end_kartu,
-            "paket": paket,
-            "act_paket": act_paket,
-            "end_paket": end_paket,
-            "balance": balance,
-            "expiry_date": expiry_date,
-            "activation_date": activation_date,
-            "status_info": status_info,
-        }
+        return make_parser(identifier_kartu, identifier_paket)(response_json)
 
     def convert_results_to_dataframe(self, results):
-        """Convert results to DataFrame with error handling"""
-        df_data = []
-
-        for result in results:
-            if result.get("status") == "success":
-                df_data.append({
-                    "nomor": result.get("nomor", ""),
-                    "kartu": result.get("kartu", ""),
-                    "act_kartu": result.get("act_kartu", ""),
-                    "end_kartu": result.get("end_kartu", ""),
-                    "paket": result.get("paket", ""),
-                    "act_paket": result.get("act_paket", ""),
-                    "end_paket": result.get("end_paket", ""),
-                    "balance": result.get("balance", "0"),
-                })
-            else:
-                # Add error entries to maintain data integrity
-                df_data.append({
-                    "nomor": result.get("nomor", ""),
-                    "kartu": "ERROR",
-                    "act_kartu": "",
-                    "end_kartu": "",
-                    "paket": "ERROR",
-                    "act_paket": "",
-                    "end_paket": "",
-                    "balance": result.get("error", "Unknown error"),
-                })
-
-        return pd.DataFrame(df_data)
+        """Convert results to DataFrame with error handling.
+
+        Loads the raw result dicts column-wise in one call and patches the
+        error rows with vectorized masks instead of a per-row Python loop.
+        """
+        columns = [
+            "nomor",
+            "kartu",
+            "act_kartu",
+            "end_kartu",
+            "paket",
+            "act_paket",
+            "end_paket",
+            "balance",
+        ]
+        raw = pd.DataFrame.from_records(results, columns=[*columns, "status", "error"])
+        df = raw[columns].fillna({"nomor": "", "balance": "0"}).fillna("")
+        failed = raw["status"].ne("success").to_numpy()
+
+        # Error entries keep a fixed placeholder to maintain data integrity
+        df.loc[failed, ["act_kartu", "end_kartu", "act_paket", "end_paket"]] = ""
+        df.loc[failed, ["kartu", "paket"]] = "ERROR"
+        df.loc[failed, "balance"] = raw.loc[failed, "error"].fillna("Unknown error")
+
+        # Few distinct values per column, so categories are much lighter
+        df["kartu"] = df["kartu"].astype("category")
+        df["paket"] = df["paket"].astype("category")
+        return df
 
     def save_results_to_json(self, results, filename=None):
-        """Save results to JSON file. Returns filename or raises exception on failure."""
+        """Save results to JSON file. Returns filename or raises exception on failure.
+
+        The array is streamed one result per line, so only a single encoded
+        result is held in memory at a time.
+        """
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"audit_results_{timestamp}.json"
 
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(results, f, indent=2, default=str)
+        with open(filename, "wb") as f:
+            f.write(b"[")
+            for i, result in enumerate(results):
+                f.write(b",\n" if i else b"\n")
+                f.write(_dumps_json(result))
+            f.write(b"\n]\n")
 
         return filename
 
     def create_synchronized_dataframe(self, results):
-        """Create a synchronized dataframe with status labels for integration with report data"""
-        df_data = []
-
-        for result in results:
-            if result.get("status") == "success":
-                # Determine status based on package availability
-                paket = result.get("paket", "")
-                if paket and paket != "":
-                    status_label = "SUKSES VALID"
-                else:
-                    status_label = "SUKSES WAIT"
-
-                df_data.append({
-                    "nomor": result.get("nomor", ""),
-                    "tujuan": result.get("nomor", ""),  # Using nomor as tujuan for now
-                    "status": 20
-                    if paket and paket != ""
-                    else 10,  # 20 for success, 10 for wait
-                    "sn": result.get("kartu", ""),
-                    "tgl_status": datetime.now().date(),
-                    "jam_status": datetime.now().time(),
-                    "status_label": status_label,
-                    "final_status": "SUKSES PROFIT",  # Default to success
-                    "act_kartu": result.get("act_kartu", ""),
-                    "end_kartu": result.get("end_kartu", ""),
-                    "act_paket": result.get("act_paket", ""),
-                    "end_paket": result.get("end_paket", ""),
-                    "balance": result.get("balance", "0"),
-                    "audit_source": "api_check",
-                })
-            else:
-                # Add error entries to maintain data integrity
-                df_data.append({
-                    "nomor": result.get("nomor", ""),
-                    "tujuan": result.get("nomor", ""),
-                    "status": 0,  # 0 for error
-                    "sn": "ERROR",
-                    "tgl_status": datetime.now().date(),
-                    "jam_status": datetime.now().time(),
-                    "status_label": "GAGAL",
-                    "final_status": "GAGAL A1",
-                    "act_kartu": "",
-                    "end_kartu": "",
-                    "act_paket": "",
-                    "end_paket": "",
-                    "balance": result.get("error", "Unknown error"),
-                    "audit_source": "api_check",
-                })
-
-        return pd.DataFrame(df_data)
+        """Create a synchronized dataframe with status labels for integration with report data
+
+        Built column by column from per-result success/package masks instead
+        of one dict per row.
+        """
+        now = datetime.now()
+        success = np.array([r.get("status") == "success" for r in results], dtype=bool)
+        has_paket = np.array([bool(r.get("paket", "")) for r in results], dtype=bool)
+        # Success rows are valid with a package, otherwise still waiting
+        is_valid = success & has_paket
+
+        def column(key, default):
+            # Error entries keep an empty placeholder to maintain data integrity
+            return [
+                r.get(key, default) if ok else "" for r, ok in zip(results, success)
+            ]
+
+        nomor = [r.get("nomor", "") for r in results]
+        return pd.DataFrame({
+            "nomor": nomor,
+            "tujuan": nomor,  # Using nomor as tujuan for now
+            # 20 for success, 10 for wait, 0 for error
+            "status": np.where(success, np.where(is_valid, 20, 10), 0),
+            "sn": [
+                r.get("kartu", "") if ok else "ERROR" for r, ok in zip(results, success)
+            ],
+            "tgl_status": now.date(),
+            "jam_status": now.time(),
+            "status_label": np.where(
+                success, np.where(is_valid, "SUKSES VALID", "SUKSES WAIT"), "GAGAL"
+            ),
+            # Default to success
+            "final_status": np.where(success, "SUKSES PROFIT", "GAGAL A1"),
+            "act_kartu": column("act_kartu", ""),
+            "end_kartu": column("end_kartu", ""),
+            "act_paket": column("act_paket", ""),
+            "end_paket": column("end_paket", ""),
+            "balance": [
+                r.get("balance", "0") if ok else r.get("error", "Unknown error")
+                for r, ok in zip(results, success)
+            ],
+            "audit_source": "api_check",
+        })
 
     def create_audit_report(self, results, template_name="standard"):
         """Create a formatted audit report based on template"""
         if template_name == "standard":
-            # Standard template with basic metrics
-            success_count = len([r for r in results if r.get("status") == "success"])
-            error_count = len([
-                r
-                for r in results
-                if r.get("status") in ["error", "api_error", "skipped"]
-            ])
+            # Standard template with basic metrics; statuses counted in one pass
+            status_counts = Counter(r.get("status") for r in results)
+            success_count = status_counts["success"]
+            error_count = (
+                status_counts["error"]
+                + status_counts["api_error"]
+                + status_counts["skipped"]
+            )
             total_count = len(results)
 
             report = {
@@ -379,20 +719,15 @@ class AuditQueueManager:
 
         elif template_name == "detailed":
             # Detailed template with more information
+            status_counts = Counter(r.get("status") for r in results)
             report = {
                 "report_title": "Laporan Audit Detail API",
                 "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "summary": {
                     "total_processed": len(results),
-                    "successful_checks": len([
-                        r for r in results if r.get("status") == "success"
-                    ]),
-                    "api_errors": len([
-                        r for r in results if r.get("status") == "api_error"
-                    ]),
-                    "connection_errors": len([
-                        r for r in results if r.get("status") == "skipped"
-                    ]),
+                    "successful_checks": status_counts["success"],
+                    "api_errors": status_counts["api_error"],
+                    "connection_errors": status_counts["skipped"],
                 },
                 "raw_data": results,
             }
@@ -1,8 +1,36 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
 import pandas as pd
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Row-level labels, in code order (see fetch_and_process_data)
+STATUS_LABELS = ["GAGAL", "SUKSES VALID", "SUKSES WAIT"]
+# Per-tujuan final status categories, in code order
+FINAL_STATUS_LABELS = ["SUKSES PROFIT", "SUKSES LOSS", "GAGAL A1"]
+# Case-sensitive "sn starts with SUP" predicate for the window counts
+_SN_IS_SUP = "SUBSTRING(sn, 1, 3) COLLATE Latin1_General_CS_AS = 'SUP'"
+# Seconds a loaded report is reused before the database is queried again
+REPORT_TTL = 600
+
+
+def split_kode_produk(kode_produk: str) -> list[str]:
+    """Sorted, de-duplicated product codes of a comma-separated list."""
+    return sorted({k.strip() for k in kode_produk.split(",") if k.strip()})
+
 
+def normalize_kode_produk(kode_produk: str) -> str:
+    """Canonical form of a comma-separated product list ("saka, mdm" -> "mdm,saka").
 
-@st.cache_data(ttl=600)
+    Used as the report cache key, so equivalent inputs share one cached load.
+    """
+    return ",".join(split_kode_produk(kode_produk))
+
+
+@st.cache_data(ttl=REPORT_TTL)
 def fetch_and_process_data(
     kode_produk: str, tgl_awal=None, tgl_akhir=None
 ) -> pd.DataFrame:
@@ -14,22 +42,41 @@ def fetch_and_process_data(
         return pd.DataFrame()
 
     conn = st.connection("sql")
-    kode_list = [k.strip() for k in kode_produk.split(",") if k.strip()]
+    kode_list = split_kode_produk(kode_produk)
 
     if not kode_list:
         return pd.DataFrame()
+    # Pad the IN-list to the next power of two by repeating the last code,
+    # so only a handful of distinct SQL texts reach the DB plan cache
+    bucket = 1 << (len(kode_list) - 1).bit_length()
+    kode_list += kode_list[-1:] * (bucket - len(kode_list))
     placeholders = ",".join([f":kode_{i}" for i in range(len(kode_list))])
 
-    # Base query - include kode_produk so we can report and filter by it
-    sql = f"SELECT kode_produk, tujuan, status, sn, tgl_status FROM transaksi WHERE kode_produk IN ({placeholders})"
+    # Base query - include kode_produk so we can report and filter by it.
+    # The per-tujuan SUKSES VALID / SUKSES WAIT counts behind final_status
+    # are computed by the database with window functions over the same rows.
+    # They match the pandas rule: rows without a tujuan belong to no group
+    # (so stay GAGAL A1), and the SUP prefix is compared case-sensitively
+    # like str.startswith, whatever the column collation is.
+    sql = (
+        "SELECT kode_produk, tujuan, status, sn, tgl_status, "
+        f"SUM(CASE WHEN tujuan IS NOT NULL AND status = 20 AND {_SN_IS_SUP} "
+        "THEN 1 ELSE 0 END) OVER (PARTITION BY tujuan) AS valid_count, "
+        "SUM(CASE WHEN tujuan IS NOT NULL AND status = 20 "
+        f"AND (sn IS NULL OR NOT {_SN_IS_SUP}) "
+        "THEN 1 ELSE 0 END) OVER (PARTITION BY tujuan) AS wait_count "
+        f"FROM transaksi WHERE kode_produk IN ({placeholders})"
+    )
 
     # Add date filter based on parameters
     date_conditions = []
     if tgl_awal:
         date_conditions.append("tgl_status >= :tgl_awal")
     if tgl_akhir:
-        # Add one day to end date to include the entire day
-        date_conditions.append("tgl_status < DATEADD(day, 1, :tgl_akhir)")
+        # Exclusive bound on the day after tgl_akhir, computed here rather
+        # than with DATEADD so the predicate stays a plain range seek on a
+        # (kode_produk, tgl_status) index
+        date_conditions.append("tgl_status < :tgl_akhir_excl")
 
     if date_conditions:
         sql += " AND " + " AND ".join(date_conditions)
@@ -40,58 +87,100 @@ def fetch_and_process_data(
     if tgl_awal:
         params["tgl_awal"] = tgl_awal
     if tgl_akhir:
-        params["tgl_akhir"] = tgl_akhir
+        params["tgl_akhir_excl"] = tgl_akhir + timedelta(days=1)
 
-    df = conn.query(sql, params=params)
+    # Build Arrow-backed columns straight from the fetched rows instead of
+    # object arrays that get converted afterwards. ttl=0 turns off the
+    # connection's own never-expiring query cache: this function is cached
+    # already, and clear_report_cache must lead to a real re-query.
+    df = conn.query(sql, params=params, ttl=0, dtype_backend="pyarrow")
 
     if df.empty:
         return df
 
-    # Split datetime into date and time columns
-    df_tgl = pd.to_datetime(df["tgl_status"])
-    df["tgl_status"] = df_tgl.dt.date
+    # tgl_status keeps the full timestamp as numpy datetime64 (pages display
+    # it as a date and filter on its int64 view); jam_status is the time of
+    # day. Arrow timestamps and unparsed strings are both converted here.
+    df_tgl = df["tgl_status"]
+    if not pd.api.types.is_datetime64_any_dtype(df_tgl):
+        df_tgl = pd.to_datetime(df_tgl).astype("datetime64[ns]")
+    df["tgl_status"] = df_tgl
     df["jam_status"] = df_tgl.dt.time
-    df["status_label"] = "GAGAL"  # Default status
-    is_success = df["status"] == 20
-    mask_valid = is_success & df["sn"].str.startswith("SUP", na=False)
-    mask_wait = is_success & ~df["sn"].str.startswith("SUP", na=False)
-
-    df.loc[mask_valid, "status_label"] = "SUKSES VALID"
-    df.loc[mask_wait, "status_label"] = "SUKSES WAIT"
-
-    # Calculate final status based on business rules
-    df["final_status"] = "GAGAL A1"  # Default final status
-
-    # Group by tujuan to apply business rules
-    for tujuan, group in df.groupby("tujuan"):
-        valid_count = (group["status_label"] == "SUKSES VALID").sum()
-        wait_count = (group["status_label"] == "SUKSES WAIT").sum()
-
-        if valid_count == 1:
-            # Rule a: exactly 1 SUKSES VALID = SUKSES PROFIT
-            df.loc[group.index, "final_status"] = "SUKSES PROFIT"
-        elif valid_count > 1:
-            # Rule b: more than 1 SUKSES VALID = SUKSES LOSS (double inject)
-            df.loc[group.index, "final_status"] = "SUKSES LOSS"
-        elif valid_count == 0 and wait_count > 0:
-            # Rule c: no SUKSES VALID but has SUKSES WAIT = SUKSES PROFIT
-            df.loc[group.index, "final_status"] = "SUKSES PROFIT"
-        # else: remains GAGAL A1 (no success at all)
+
+    # Arrow-backed strings: startswith/contains/groupby on these run in C
+    # instead of boxing a Python str per row
+    df["tujuan"] = df["tujuan"].astype("string[pyarrow]")
+    df["sn"] = df["sn"].astype("string[pyarrow]")
+
+    # Label each row via integer codes into STATUS_LABELS (GAGAL by default)
+    is_success = df["status"].to_numpy(dtype=np.int64, na_value=0) == 20
+    starts_sup = df["sn"].str.startswith("SUP", na=False).to_numpy(dtype=bool)
+    label_codes = np.where(is_success, np.where(starts_sup, 1, 2), 0).astype(np.int8)
+    df["status_label"] = pd.Categorical.from_codes(label_codes, STATUS_LABELS)
+
+    # Calculate final status based on business rules, per tujuan:
+    # a. exactly 1 SUKSES VALID            -> SUKSES PROFIT
+    # b. more than 1 SUKSES VALID          -> SUKSES LOSS (double inject)
+    # c. no SUKSES VALID but a SUKSES WAIT -> SUKSES PROFIT
+    # otherwise GAGAL A1 (no success at all)
+    valid_count = df.pop("valid_count").to_numpy(dtype=np.int64, na_value=0)
+    wait_count = df.pop("wait_count").to_numpy(dtype=np.int64, na_value=0)
+    final_codes = np.select(
+        [valid_count == 1, valid_count > 1, wait_count > 0], [0, 1, 0], default=2
+    ).astype(np.int8)
+    df["final_status"] = pd.Categorical.from_codes(final_codes, FINAL_STATUS_LABELS)
+
+    # Few distinct products: store as category so filters compare int codes
+    df["kode_produk"] = df["kode_produk"].astype("category")
 
     return df
 
 
-@st.cache_data(ttl=300)
+@st.cache_resource
+def get_fetch_executor() -> ThreadPoolExecutor:
+    """Shared worker pool so SQL loads don't block the Streamlit script thread."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="rekap_fetch")
+
+
+def fetch_and_process_data_async(
+    kode_produk: str, tgl_awal=None, tgl_akhir=None
+) -> Future:
+    """Submit `fetch_and_process_data` to the background pool.
+
+    The result still goes through the `st.cache_data` cache, so a finished
+    load is reused by later reruns and sessions with the same parameters.
+    The worker runs under the caller's ScriptRunContext, so the cache,
+    `st.connection` and the cache spinner see the session that asked for
+    the load. Errors are raised from the returned future's `result()`.
+    """
+    return get_fetch_executor().submit(
+        _run_in_script_ctx,
+        get_script_run_ctx(),
+        fetch_and_process_data,
+        kode_produk,
+        tgl_awal,
+        tgl_akhir,
+    )
+
+
+def _run_in_script_ctx(ctx, fn, *args):
+    """Run fn on a pool thread under the script run context it was submitted from."""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return fn(*args)
+
+
 def get_summary_table(df: pd.DataFrame) -> pd.DataFrame:
     """Transformasi data untuk tabel ringkasan.
 
-    Cached to avoid repeated grouping work on reruns (e.g., when switching tabs).
+    Not cached itself: hashing a full frame on every call costs about as
+    much as the groupby. The report page builds it once per load through
+    `build_report_views`.
     """
     if df.empty:
         return pd.DataFrame()
     # Use final_status for summary instead of status_label; include kode_produk for multi-product reports
     summary = (
-        df.groupby(["kode_produk", "tujuan", "final_status"])
+        df.groupby(["kode_produk", "tujuan", "final_status"], observed=True)
         .size()
         .unstack(fill_value=0)
         .reset_index()
@@ -105,7 +194,7 @@ def get_summary_table(df: pd.DataFrame) -> pd.DataFrame:
 def get_styled_summary_table(df: pd.DataFrame) -> pd.DataFrame:
     """Transformasi data untuk tabel ringkasan tanpa color coding.
 
-    Uses cached `get_summary_table` internally to avoid repeated grouping work.
+    Kept for callers that hold a frame; same result as `get_summary_table`.
     """
     if df.empty:
         return pd.DataFrame()
@@ -118,39 +207,46 @@ def apply_filters(df: pd.DataFrame, session_state) -> pd.DataFrame:
     if df.empty:
         return df
 
-    filtered_df = df.copy()
+    # Combine every filter into one mask so the frame is sliced only once
+    mask = np.ones(len(df), dtype=bool)
 
     # Filter by final status
     if session_state.get("final_status_filter", []):
-        filtered_df = filtered_df[
-            filtered_df["final_status"].isin(session_state["final_status_filter"])
-        ]
+        mask &= df["final_status"].isin(session_state["final_status_filter"]).to_numpy()
 
     # Filter by kode_produk (partial match)
     if session_state.get("kode_produk_filter", ""):
-        kode_filter = session_state["kode_produk_filter"].lower()
-        filtered_df = filtered_df[
-            filtered_df["kode_produk"].str.lower().str.contains(kode_filter, na=False)
-        ]
+        kode_filter = session_state["kode_produk_filter"]
+        mask &= (
+            df["kode_produk"]
+            .str.contains(kode_filter, case=False, na=False, regex=False)
+            .to_numpy(dtype=bool)
+        )
 
     # Filter by tujuan (partial match)
     if session_state.get("tujuan_filter", ""):
-        tujuan_filter = session_state["tujuan_filter"].lower()
-        filtered_df = filtered_df[
-            filtered_df["tujuan"].str.lower().str.contains(tujuan_filter, na=False)
-        ]
+        tujuan_filter = session_state["tujuan_filter"]
+        mask &= (
+            df["tujuan"]
+            .str.contains(tujuan_filter, case=False, na=False, regex=False)
+            .to_numpy(dtype=bool)
+        )
 
     # Filter by SN (partial match)
     if session_state.get("sn_filter", ""):
-        sn_filter = session_state["sn_filter"].lower()
-        filtered_df = filtered_df[
-            filtered_df["sn"].str.lower().str.contains(sn_filter, na=False)
-        ]
-
-    return filtered_df
+        sn_filter = session_state["sn_filter"]
+        mask &= (
+            df["sn"]
+            .str.contains(sn_filter, case=False, na=False, regex=False)
+            .to_numpy(dtype=bool)
+        )
+
+    # Nothing filtered out: hand back the frame itself instead of a copy
+    if mask.all():
+        return df
+    return df.loc[mask]
 
 
-@st.cache_data(ttl=300)
 def get_dashboard_metrics(df: pd.DataFrame) -> dict:
     """Compute simple dashboard metrics from the dataframe.
 
@@ -172,16 +268,45 @@ def get_dashboard_metrics(df: pd.DataFrame) -> dict:
     }
 
 
-@st.cache_data(ttl=300)
 def get_status_counts(df: pd.DataFrame) -> pd.DataFrame:
     """Return counts of each final_status as a small dataframe for plotting."""
     if df.empty:
         return pd.DataFrame(columns=["final_status", "count"])
 
-    counts = (
-        df["final_status"]
-        .value_counts()
-        .rename_axis("final_status")
-        .reset_index(name="count")
-    )
+    counts = df["final_status"].value_counts()
+    # Categorical columns also report categories with zero rows; drop them
+    counts = counts[counts > 0].rename_axis("final_status").reset_index(name="count")
     return counts
+
+
+def get_report_bounds(df: pd.DataFrame) -> tuple:
+    """(min_date, max_date, min_time, max_time) of a report frame.
+
+    Used as widget defaults by the report tabs.
+    """
+    if df.empty:
+        return None, None, None, None
+
+    min_date, max_date = df["tgl_status"].agg(["min", "max"])
+    min_time, max_time = df["jam_status"].agg(["min", "max"])
+    return min_date.date(), max_date.date(), min_time, max_time
+
+
+def build_report_views(df: pd.DataFrame) -> dict:
+    """Summary table, dashboard metrics, status counts and bounds of one frame.
+
+    The report page builds these once per load and keeps them next to the
+    frame, so the Dashboard and the filtered tabs always describe the same
+    rows and reruns don't repeat the groupby or the column scans.
+    """
+    return {
+        "summary": get_summary_table(df),
+        "metrics": get_dashboard_metrics(df),
+        "status_counts": get_status_counts(df),
+        "bounds": get_report_bounds(df),
+    }
+
+
+def clear_report_cache() -> None:
+    """Drop every cached report so the next load queries the database again."""
+    fetch_and_process_data.clear()
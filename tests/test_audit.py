@@ -0,0 +1,244 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from services.audit import (
+    SPILL_BATCH,
+    UNREACHABLE_AFTER,
+    AuditQueueManager,
+    TokenBucket,
+    make_parser,
+)
+
+SAMPLE_RESPONSE = (Path(__file__).parent.parent / "sample_response.json").read_bytes()
+API_URL = "http://api.test/get_package_status"
+KARTU = "Kartu"
+PAKET = "Freedom Internet 1.5GB/1Hari"
+
+
+def ok_response():
+    return Mock(status_code=200, content=SAMPLE_RESPONSE)
+
+
+@pytest.fixture
+def qm():
+    manager = AuditQueueManager(delay_seconds=0, max_queue=5)
+    manager.session = Mock()
+    manager.session.get.return_value = ok_response()
+    # What start_processing would set up, without starting worker threads
+    manager._parse = make_parser(KARTU, PAKET)
+    manager._api_ok = True
+    return manager
+
+
+def check(qm, number="085754464750", api_url=API_URL):
+    return qm._check_single_number(number, api_url, KARTU, PAKET, "user")
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    """Counts requests; replies with server.status, or never when it is None"""
+
+    def do_GET(self):
+        self.server.hits += 1
+        if self.server.status is None:
+            self.server.release.wait(5)
+            return
+        self.send_response(self.server.status)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeApiHandler)
+    server.daemon_threads = True
+    server.hits = 0
+    server.status = None
+    server.release = threading.Event()
+    server.url = f"http://127.0.0.1:{server.server_port}/get_package_status"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+class TestAddToQueue:
+    @pytest.mark.parametrize("number", ["08123456789", "+628123456789", 6281234567])
+    def test_accepts_valid_numbers(self, qm, number):
+        assert qm.add_to_queue(number)
+        assert list(qm.queue) == [number]
+
+    @pytest.mark.parametrize(
+        "number", ["", "0812-3456-789", "0812345", "1234567890123456", "08123abc"]
+    )
+    def test_rejects_invalid_numbers(self, qm, number):
+        assert not qm.add_to_queue(number)
+        assert not qm.queue
+
+    def test_respects_max_queue(self, qm):
+        added = [qm.add_to_queue(f"0812345678{i}") for i in range(7)]
+        assert added == [True] * 5 + [False] * 2
+
+
+class TestCheckCache:
+    def test_success_is_parsed(self, qm):
+        result = check(qm)
+        assert result["status"] == "success"
+        assert result["nomor"] == "085754464750"
+        assert result["paket"] == PAKET
+        assert result["cached"] is False
+
+    def test_repeat_check_is_served_from_cache(self, qm):
+        first = check(qm)
+        second = check(qm)
+        assert qm.session.get.call_count == 1
+        assert second["cached"] is True
+        assert {**second, "cached": False} == first
+
+    def test_cached_result_is_a_copy(self, qm):
+        check(qm)["paket"] = "changed"
+        assert check(qm)["paket"] == PAKET
+
+    def test_expired_entry_is_refetched(self, qm, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr("services.audit.time.monotonic", lambda: now[0])
+        check(qm)
+        now[0] += qm.cache_ttl
+        assert check(qm)["cached"] is False
+        assert qm.session.get.call_count == 2
+
+    def test_zero_ttl_disables_cache(self, qm):
+        qm.cache_ttl = 0
+        check(qm)
+        assert check(qm)["cached"] is False
+        assert qm.session.get.call_count == 2
+
+    def test_zero_ttl_ignores_stored_entries(self, qm):
+        check(qm)
+        qm.cache_ttl = 0
+        assert check(qm)["cached"] is False
+        assert qm.session.get.call_count == 2
+
+    def test_lowered_ttl_applies_to_stored_entries(self, qm, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr("services.audit.time.monotonic", lambda: now[0])
+        check(qm)
+        now[0] += 60
+        qm.cache_ttl = 30
+        assert check(qm)["cached"] is False
+        assert qm.session.get.call_count == 2
+
+    def test_errors_are_not_cached(self, qm):
+        qm.session.get.return_value = Mock(status_code=500, content=b"")
+        assert check(qm)["status"] == "skipped"
+        qm.session.get.return_value = ok_response()
+        assert check(qm)["status"] == "success"
+
+
+class TestUnreachableApi:
+    def test_single_timeout_keeps_api_up(self, qm):
+        qm.session.get.side_effect = [requests.exceptions.Timeout(), ok_response()]
+        assert check(qm, "081111111111")["error"] == "Request timeout"
+        assert qm._api_ok
+        assert check(qm, "082222222222")["status"] == "success"
+
+    def test_success_resets_failure_streak(self, qm):
+        timeout = requests.exceptions.Timeout()
+        qm.session.get.side_effect = (
+            [timeout] * (UNREACHABLE_AFTER - 1) + [ok_response()] + [timeout]
+        )
+        for i in range(UNREACHABLE_AFTER + 1):
+            check(qm, f"08123456780{i}")
+        assert qm._api_ok
+
+    @pytest.mark.parametrize(
+        "error", [requests.exceptions.Timeout, requests.exceptions.ConnectionError]
+    )
+    def test_repeated_failures_mark_api_down(self, qm, error):
+        qm.session.get.side_effect = error()
+        for i in range(UNREACHABLE_AFTER):
+            assert check(qm, f"08123456780{i}")["status"] == "skipped"
+        assert not qm._api_ok
+
+        # The next number is skipped without a request until the re-probe
+        # interval has passed
+        qm._last_probe = time.monotonic()
+        calls = qm.session.get.call_count
+        assert check(qm)["error"] == "API unreachable"
+        assert qm.session.get.call_count == calls
+
+
+class TestRealSession:
+    """Checks sent through the pooled session's real HTTPAdapter"""
+
+    @pytest.fixture
+    def live(self, qm, monkeypatch):
+        monkeypatch.setattr("services.audit.READ_TIMEOUT", 0.2)
+        qm.session = qm._create_session()
+        yield qm
+        qm.close()
+
+    def test_read_timeout_is_one_request(self, live, api):
+        result = check(live, api_url=api.url)
+        assert result["error"] == "Request timeout"
+        assert api.hits == 1
+
+    @pytest.mark.parametrize("status", [429, 502, 503, 504])
+    def test_error_status_reaches_rate_limiter(self, live, api, status):
+        live.delay_seconds = 1
+        live._rate_limiter = TokenBucket(1, 1)
+        api.status = status
+        assert check(live, api_url=api.url)["error"] == f"HTTP {status}"
+        assert api.hits == 1
+        assert live._rate_limiter.rate == 0.5
+
+
+class TestSpillFile:
+    @pytest.fixture
+    def unwritable(self, qm, tmp_path):
+        qm.results_file = str(tmp_path / "missing" / "results.jsonl")
+        return qm
+
+    def test_write_error_keeps_results_buffered(self, unwritable, tmp_path):
+        qm = unwritable
+        for i in range(SPILL_BATCH):
+            qm._record_result({"nomor": str(i), "status": "success"})
+        assert qm.processed_count == SPILL_BATCH
+        assert "results.jsonl" in qm.spill_error
+        assert len(qm.load_all_results()) == SPILL_BATCH
+
+        # The next batch retries the write, including the buffered results
+        (tmp_path / "missing").mkdir()
+        for i in range(SPILL_BATCH):
+            qm._record_result({"nomor": str(i), "status": "skipped"})
+        assert qm.spill_error is None
+        assert not qm._spill_buffer
+        assert len(qm.load_all_results()) == 2 * SPILL_BATCH
+
+    def test_worker_survives_write_error(self, unwritable, monkeypatch):
+        qm = unwritable
+        monkeypatch.setattr("services.audit.SPILL_BATCH", 2)
+        for i in range(5):
+            qm.add_to_queue(f"08123456780{i}")
+        qm.start_processing(API_URL, KARTU, PAKET, "user")
+        try:
+            deadline = time.monotonic() + 5
+            while qm.processed_count < 5 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert qm.processed_count == 5
+            assert not qm.queue
+            assert all(thread.is_alive() for thread in qm.threads)
+            assert qm.spill_error is not None
+            assert len(qm.results) == 5
+        finally:
+            qm.stop_processing()
@@ -0,0 +1,220 @@
+import sqlite3
+import threading
+from datetime import date, time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import data_service
+from services.data_service import (
+    apply_filters,
+    build_report_views,
+    clear_report_cache,
+    fetch_and_process_data,
+    get_summary_table,
+)
+
+ROWS = [
+    # kode_produk, tujuan, status, sn, tgl_status
+    ("mdm", "0811", 20, "SUP001", "2024-01-01 08:00:00"),  # 1 valid -> PROFIT
+    ("mdm", "0811", 40, None, "2024-01-01 09:00:00"),
+    ("mdm", "0812", 20, "SUP002", "2024-01-02 10:00:00"),  # 2 valid -> LOSS
+    ("saka", "0812", 20, "SUP003", "2024-01-02 11:00:00"),
+    ("mdm", "0813", 20, "sup004", "2024-01-03 12:00:00"),  # lowercase -> wait
+    ("mdm", "0814", 20, None, "2024-01-03 13:00:00"),  # no sn -> wait
+    ("saka", "0815", 20, "SU", "2024-01-04 14:00:00"),  # short sn -> wait
+    ("saka", "0816", 40, "SUP005", "2024-01-04 15:00:00"),  # failed -> GAGAL A1
+    # Rows without a tujuan never form a group, so they stay GAGAL A1
+    ("mdm", None, 20, "SUP006", "2024-01-05 16:00:00"),
+    ("mdm", None, 20, "SUP007", "2024-01-05 17:00:00"),
+    ("saka", None, 20, "XYZ", "2024-01-05 18:00:00"),
+    ("other", "0811", 20, "SUP008", "2024-01-06 19:00:00"),  # not selected
+]
+
+
+def baseline_labels(df):
+    """status_label / final_status as the original per-group pandas loop did."""
+    is_success = df["status"] == 20
+    starts_sup = df["sn"].str.startswith("SUP", na=False)
+    status_label = pd.Series("GAGAL", index=df.index)
+    status_label[is_success & starts_sup] = "SUKSES VALID"
+    status_label[is_success & ~starts_sup] = "SUKSES WAIT"
+
+    final_status = pd.Series("GAGAL A1", index=df.index)
+    for _, group in status_label.groupby(df["tujuan"]):
+        valid_count = (group == "SUKSES VALID").sum()
+        wait_count = (group == "SUKSES WAIT").sum()
+        if valid_count == 1:
+            final_status[group.index] = "SUKSES PROFIT"
+        elif valid_count > 1:
+            final_status[group.index] = "SUKSES LOSS"
+        elif wait_count > 0:
+            final_status[group.index] = "SUKSES PROFIT"
+    return status_label, final_status
+
+
+class SQLiteConnection:
+    """Stand-in for st.connection("sql") backed by an in-memory SQLite table."""
+
+    def __init__(self, rows):
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        # Case-sensitive like the collation the query asks SQL Server for
+        self.db.create_collation("Latin1_General_CS_AS", lambda a, b: (a > b) - (a < b))
+        self.db.execute(
+            "CREATE TABLE transaksi "
+            "(kode_produk TEXT, tujuan TEXT, status INT, sn TEXT, tgl_status TEXT)"
+        )
+        self.db.executemany("INSERT INTO transaksi VALUES (?, ?, ?, ?, ?)", rows)
+        self.queries = []
+
+    def query(self, sql, params=None, **kwargs):
+        self.queries.append((sql, params, kwargs))
+        return pd.read_sql(
+            sql, self.db, params=params, dtype_backend=kwargs.get("dtype_backend")
+        )
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    connection = SQLiteConnection(ROWS)
+    monkeypatch.setattr(data_service.st, "connection", lambda name: connection)
+    clear_report_cache()
+    yield connection
+    clear_report_cache()
+
+
+@pytest.fixture
+def report(conn):
+    return fetch_and_process_data("saka, mdm")
+
+
+def test_final_status_matches_baseline_rule(report):
+    expected = pd.DataFrame(
+        [r for r in ROWS if r[0] in ("mdm", "saka")],
+        columns=["kode_produk", "tujuan", "status", "sn", "tgl_status"],
+    )
+    status_label, final_status = baseline_labels(expected)
+
+    # Row order is up to the database, so compare keyed on the unique tgl_status
+    got = report.set_index(report["tgl_status"].dt.strftime("%Y-%m-%d %H:%M:%S"))
+    key = expected["tgl_status"]
+    assert len(got) == len(expected)
+    assert got.loc[key, "status_label"].astype(str).tolist() == status_label.tolist()
+    assert got.loc[key, "final_status"].astype(str).tolist() == final_status.tolist()
+
+
+def test_null_tujuan_and_lowercase_sup(report):
+    no_tujuan = report[report["tujuan"].isna()]
+    assert (no_tujuan["final_status"] == "GAGAL A1").all()
+
+    lower = report[report["tujuan"] == "0813"].iloc[0]
+    assert lower["status_label"] == "SUKSES WAIT"
+    assert lower["final_status"] == "SUKSES PROFIT"
+
+
+def test_report_dtypes(report):
+    assert report["tgl_status"].dtype == "datetime64[ns]"
+    assert report["tujuan"].dtype == "string[pyarrow]"
+    assert isinstance(report["final_status"].dtype, pd.CategoricalDtype)
+    assert isinstance(report["kode_produk"].dtype, pd.CategoricalDtype)
+
+
+def test_kode_list_is_canonical(conn):
+    fetch_and_process_data("saka,mdm,mdm")
+    fetch_and_process_data("mdm, saka")
+    (sql_a, params_a, _), (sql_b, params_b, _) = conn.queries
+    assert sql_a == sql_b
+    assert params_a == params_b
+
+
+def test_refresh_requeries_database(conn):
+    assert len(fetch_and_process_data("mdm")) == 7
+    conn.db.execute(
+        "INSERT INTO transaksi VALUES ('mdm', '0817', 20, 'SUP009', '2024-01-07 08:00:00')"
+    )
+    assert len(fetch_and_process_data("mdm")) == 7  # served from the cache
+
+    clear_report_cache()
+    assert len(fetch_and_process_data("mdm")) == 8
+    # The connection-level cache would otherwise keep returning stale rows
+    assert all(kwargs["ttl"] == 0 for _, _, kwargs in conn.queries)
+
+
+def test_async_fetch_runs_under_script_context(conn, monkeypatch):
+    ctx = object()
+    seen = []
+    monkeypatch.setattr(data_service, "get_script_run_ctx", lambda: ctx)
+    monkeypatch.setattr(
+        data_service,
+        "add_script_run_ctx",
+        lambda thread, ctx: seen.append((thread, ctx)),
+    )
+
+    result = data_service.fetch_and_process_data_async("mdm").result()
+    assert len(result) == 7
+    ((thread, attached),) = seen
+    assert attached is ctx
+    assert thread is not threading.main_thread()
+
+
+def test_async_fetch_error_is_raised_from_result(conn, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(conn, "query", broken)
+    with pytest.raises(RuntimeError, match="db down"):
+        data_service.fetch_and_process_data_async("mdm").result()
+
+
+def test_empty_kode_skips_query(conn):
+    assert fetch_and_process_data(" , ").empty
+    assert conn.queries == []
+
+
+def test_summary_table_counts_observed_statuses(report):
+    summary = get_summary_table(report)
+    assert list(summary.columns) == [
+        "kode_produk",
+        "tujuan",
+        "SUKSES PROFIT",
+        "SUKSES LOSS",
+        "GAGAL A1",
+    ]
+    row = summary[(summary["kode_produk"] == "saka") & (summary["tujuan"] == "0812")]
+    assert row[["SUKSES PROFIT", "SUKSES LOSS", "GAGAL A1"]].values.tolist() == [
+        [0, 1, 0]
+    ]
+    assert get_summary_table(pd.DataFrame()).empty
+
+
+def test_report_views_describe_one_frame(report):
+    views = build_report_views(report)
+    assert views["metrics"]["total"] == len(report)
+    assert views["status_counts"]["count"].sum() == len(report)
+    assert views["summary"].equals(get_summary_table(report))
+    assert views["bounds"] == (date(2024, 1, 1), date(2024, 1, 5), time(8), time(18))
+
+
+class TestApplyFilters:
+    def test_no_filter_returns_same_frame(self, report):
+        assert apply_filters(report, {}) is report
+        every_status = ["SUKSES PROFIT", "SUKSES LOSS", "GAGAL A1"]
+        assert apply_filters(report, {"final_status_filter": every_status}) is report
+
+    def test_filters_are_combined(self, report):
+        filtered = apply_filters(
+            report,
+            {"final_status_filter": ["SUKSES LOSS"], "kode_produk_filter": "SAK"},
+        )
+        assert filtered["tujuan"].tolist() == ["0812"]
+
+    def test_substring_match_is_literal_and_case_insensitive(self, report):
+        assert len(apply_filters(report, {"sn_filter": "sup00"})) == 7
+        assert apply_filters(report, {"sn_filter": "SUP.0"}).empty
+
+    def test_filtered_frame_keeps_index(self, report):
+        filtered = apply_filters(report, {"tujuan_filter": "0811"})
+        np.testing.assert_array_equal(
+            filtered.index, report.index[report["tujuan"] == "0811"]
+        )